@@ -2,10 +2,10 @@ import asyncio
 import binascii
 from collections import defaultdict
 import contextlib
+import ctypes
 import errno
 import functools
 import importlib
-import inspect
 import json
 import logging
 import multiprocessing
@@ -13,6 +13,7 @@ import os
 import platform
 import re
 import signal
+import stat
 import subprocess
 import sys
 import tempfile
@@ -20,6 +21,7 @@ import threading
 import time
 from urllib.parse import urlencode, unquote, urlparse, parse_qsl, urlunparse
 import warnings
+import weakref
 from inspect import signature
 from pathlib import Path
 from subprocess import list2cmdline
@@ -27,6 +29,7 @@ from typing import (
     TYPE_CHECKING,
     Any,
     Dict,
+    FrozenSet,
     Optional,
     Sequence,
     Tuple,
@@ -39,9 +42,11 @@ from typing import (
 # Import psutil after ray so the packaged version is used.
 import psutil
 from google.protobuf import json_format
+from packaging.version import parse as parse_version
 
 import ray
 import ray._private.ray_constants as ray_constants
+from ray._private.tls_utils import load_certs_from_env
 from ray.core.generated.runtime_env_common_pb2 import (
     RuntimeEnvInfo as ProtoRuntimeEnvInfo,
 )
@@ -49,8 +54,14 @@ from ray.core.generated.runtime_env_common_pb2 import (
 if TYPE_CHECKING:
     from ray.runtime_env import RuntimeEnv
 
+_IS_LINUX = sys.platform.startswith("linux")
+_IS_DARWIN = sys.platform == "darwin"
+_IS_WIN32 = sys.platform == "win32"
+
+fcntl = None
 pwd = None
-if sys.platform != "win32":
+if not _IS_WIN32:
+    import fcntl
     import pwd
 
 logger = logging.getLogger(__name__)
@@ -65,7 +76,10 @@ win32_job = None
 win32_AssignProcessToJobObject = None
 
 ENV_DISABLE_DOCKER_CPU_WARNING = "RAY_DISABLE_DOCKER_CPU_WARNING" in os.environ
-_PYARROW_VERSION = None
+# Sentinel for a pyarrow version that hasn't been looked up yet, since None means
+# that pyarrow isn't installed.
+_PYARROW_UNSET = object()
+_PYARROW_VERSION = _PYARROW_UNSET
 
 # This global variable is used for testing only
 _CALLED_FREQ = defaultdict(lambda: 0)
@@ -75,14 +89,31 @@ PLACEMENT_GROUP_INDEXED_BUNDLED_RESOURCE_PATTERN = re.compile(
     r"(.+)_group_(\d+)_([0-9a-zA-Z]+)"
 )
 PLACEMENT_GROUP_WILDCARD_RESOURCE_PATTERN = re.compile(r"(.+)_group_([0-9a-zA-Z]+)")
+# Matches both of the above in a single pass. `bundle_index` is None for wildcard
+# resources, e.g. "CPU_group_<pg_id>", and set for indexed bundle resources, e.g.
+# "CPU_group_0_<pg_id>".
+PLACEMENT_GROUP_RESOURCE_PATTERN = re.compile(
+    r"(?P<name>.+)_group_(?:(?P<bundle_index>\d+)_)?(?P<pg_id>[0-9a-zA-Z]+)"
+)
+# Matches `${VAR}` references left over after os.path.expandvars().
+_UNEXPANDED_ENV_VAR_PATTERN = re.compile(r"\$\{[A-Z0-9_]+\}")
 
 
 def get_user_temp_dir():
-    if "RAY_TMPDIR" in os.environ:
-        return os.environ["RAY_TMPDIR"]
-    elif sys.platform.startswith("linux") and "TMPDIR" in os.environ:
-        return os.environ["TMPDIR"]
-    elif sys.platform.startswith("darwin") or sys.platform.startswith("linux"):
+    return _resolve_user_temp_dir(
+        os.environ.get("RAY_TMPDIR"), os.environ.get("TMPDIR")
+    )
+
+
+# Cached by the env vars the result depends on, so that changing them (e.g.
+# RAY_TMPDIR in tests) is still picked up.
+@functools.lru_cache(maxsize=None)
+def _resolve_user_temp_dir(ray_tmpdir: Optional[str], tmpdir: Optional[str]) -> str:
+    if ray_tmpdir is not None:
+        return ray_tmpdir
+    elif _IS_LINUX and tmpdir is not None:
+        return tmpdir
+    elif _IS_DARWIN or _IS_LINUX:
         # Ideally we wouldn't need this fallback, but keep it for now for
         # for compatibility
         tempdir = os.path.join(os.sep, "tmp")
@@ -101,40 +132,73 @@ def get_ray_address_file(temp_dir: Optional[str]):
     return os.path.join(temp_dir, "ray_current_cluster")
 
 
+def _log_overwriting_ray_address(prev_address: str, ray_address: str):
+    logger.info(
+        "Overwriting previous Ray address (%s). "
+        "Running ray.init() on this node will now connect to the new "
+        "instance at %s. To override this behavior, pass "
+        "address=%s to ray.init().",
+        prev_address,
+        ray_address,
+        prev_address,
+    )
+
+
 def write_ray_address(ray_address: str, temp_dir: Optional[str] = None):
     address_file = get_ray_address_file(temp_dir)
-    if os.path.exists(address_file):
-        with open(address_file, "r") as f:
-            prev_address = f.read()
-        if prev_address == ray_address:
-            return
+    if fcntl is None:
+        # No flock() on Windows, fall back to a plain read-compare-write.
+        if os.path.exists(address_file):
+            with open(address_file, "r") as f:
+                prev_address = f.read()
+            if prev_address == ray_address:
+                return
+            _log_overwriting_ray_address(prev_address, ray_address)
 
-        logger.info(
-            f"Overwriting previous Ray address ({prev_address}). "
-            "Running ray.init() on this node will now connect to the new "
-            f"instance at {ray_address}. To override this behavior, pass "
-            f"address={prev_address} to ray.init()."
-        )
+        with open(address_file, "w+") as f:
+            f.write(ray_address)
+        return
 
-    with open(address_file, "w+") as f:
-        f.write(ray_address)
+    # Open (or create) the file once and hold an exclusive lock across the
+    # read-compare-write, so that concurrent `ray start` / `ray.init()` calls on
+    # the same node can't interleave their writes.
+    fd = os.open(address_file, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        chunks = []
+        while True:
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        prev_address = b"".join(chunks).decode()
+        if prev_address == ray_address:
+            return
+        if prev_address:
+            _log_overwriting_ray_address(prev_address, ray_address)
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, ray_address.encode(), 0)
+    finally:
+        # Closing the fd also releases the lock.
+        os.close(fd)
 
 
 def reset_ray_address(temp_dir: Optional[str] = None):
     address_file = get_ray_address_file(temp_dir)
-    if os.path.exists(address_file):
-        try:
-            os.remove(address_file)
-        except OSError:
-            pass
+    try:
+        os.remove(address_file)
+    except OSError:
+        # Includes FileNotFoundError if there is no address file.
+        pass
 
 
 def read_ray_address(temp_dir: Optional[str] = None) -> str:
     address_file = get_ray_address_file(temp_dir)
-    if not os.path.exists(address_file):
+    try:
+        with open(address_file, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
         return None
-    with open(address_file, "r") as f:
-        return f.read().strip()
 
 
 def format_error_message(exception_message: str, task_exception: bool = False):
@@ -150,13 +214,13 @@ def format_error_message(exception_message: str, task_exception: bool = False):
     Returns:
         A string of the formatted exception message.
     """
-    lines = exception_message.split("\n")
-    if task_exception:
-        # For errors that occur inside of tasks, remove lines 1 and 2 which are
-        # always the same, they just contain information about the worker code.
-        lines = lines[0:1] + lines[3:]
-        pass
-    return "\n".join(lines)
+    if not task_exception:
+        return exception_message
+    # For errors that occur inside of tasks, remove lines 1 and 2 which are
+    # always the same, they just contain information about the worker code.
+    # Only the first 3 lines need to be split off for that.
+    lines = exception_message.split("\n", 3)
+    return "\n".join(lines[0:1] + lines[3:])
 
 
 def push_error_to_driver(
@@ -253,12 +317,14 @@ def binary_to_task_id(binary_task_id):
 
 
 def binary_to_hex(identifier):
-    hex_identifier = binascii.hexlify(identifier)
-    hex_identifier = hex_identifier.decode()
-    return hex_identifier
+    # bytes.hex() produces the str directly, without an intermediate bytes object.
+    return identifier.hex()
 
 
 def hex_to_binary(hex_identifier):
+    if type(hex_identifier) is str:
+        return bytes.fromhex(hex_identifier)
+    # bytes.fromhex() only accepts str; keep supporting hex-encoded bytes.
     return binascii.unhexlify(hex_identifier)
 
 
@@ -293,6 +359,25 @@ def get_visible_accelerator_ids() -> Mapping[str, Optional[List[str]]]:
     }
 
 
+# Cached by _get_worker_runtime_context().
+_worker_runtime_context = None
+
+
+def _get_worker_runtime_context():
+    """Return `ray.get_runtime_context()`, cached once running as a worker.
+
+    The runtime context object is stable for the lifetime of a worker process, so
+    this saves going through the client mode hook on every task execution.
+    """
+    global _worker_runtime_context
+    if (
+        _worker_runtime_context is None
+        or _worker_runtime_context.worker.mode != ray._private.worker.WORKER_MODE
+    ):
+        _worker_runtime_context = ray.get_runtime_context()
+    return _worker_runtime_context
+
+
 def set_omp_num_threads_if_unset() -> bool:
     """Set the OMP_NUM_THREADS to default to num cpus assigned to the worker
 
@@ -308,7 +393,7 @@ def set_omp_num_threads_if_unset() -> bool:
         return False
 
     # If unset, try setting the correct CPU count assigned.
-    runtime_ctx = ray.get_runtime_context()
+    runtime_ctx = _get_worker_runtime_context()
     if runtime_ctx.worker.mode != ray._private.worker.WORKER_MODE:
         # Non worker mode, no ops.
         return False
@@ -338,14 +423,25 @@ def set_visible_accelerator_ids() -> None:
     TPU_VISIBLE_CHIPS , HABANA_VISIBLE_MODULES ,...) environment variables based
     on the accelerator runtime.
     """
+    get_accelerator_manager_for_resource = (
+        ray._private.accelerators.get_accelerator_manager_for_resource
+    )
     for resource_name, accelerator_ids in (
-        ray.get_runtime_context().get_accelerator_ids().items()
+        _get_worker_runtime_context().get_accelerator_ids().items()
     ):
-        ray._private.accelerators.get_accelerator_manager_for_resource(
+        # Note: an empty id list isn't skipped since it hides all accelerators,
+        # and the env vars are always rewritten because a previous task on this
+        # worker may have changed them.
+        get_accelerator_manager_for_resource(
             resource_name
         ).set_current_process_visible_accelerator_ids(accelerator_ids)
 
 
+# Resource names that can't be passed through the `resources` option since they
+# have dedicated options (num_cpus, num_gpus, memory, object_store_memory).
+_RESERVED_RESOURCE_KEYS = frozenset({"CPU", "GPU", "memory", "object_store_memory"})
+
+
 def resources_from_ray_options(options_dict: Dict[str, Any]) -> Dict[str, Any]:
     """Determine a task's resource requirements.
 
@@ -357,15 +453,18 @@ def resources_from_ray_options(options_dict: Dict[str, Any]) -> Dict[str, Any]:
     """
     resources = (options_dict.get("resources") or {}).copy()
 
-    if "CPU" in resources or "GPU" in resources:
-        raise ValueError(
-            "The resources dictionary must not contain the key 'CPU' or 'GPU'"
-        )
-    elif "memory" in resources or "object_store_memory" in resources:
-        raise ValueError(
-            "The resources dictionary must not "
-            "contain the key 'memory' or 'object_store_memory'"
-        )
+    # Do a single set check for the common case where none of the reserved keys
+    # are present.
+    if not resources.keys().isdisjoint(_RESERVED_RESOURCE_KEYS):
+        if "CPU" in resources or "GPU" in resources:
+            raise ValueError(
+                "The resources dictionary must not contain the key 'CPU' or 'GPU'"
+            )
+        else:
+            raise ValueError(
+                "The resources dictionary must not "
+                "contain the key 'memory' or 'object_store_memory'"
+            )
 
     num_cpus = options_dict.get("num_cpus")
     num_gpus = options_dict.get("num_gpus")
@@ -402,14 +501,19 @@ class Unbuffered(object):
 
     def __init__(self, stream):
         self.stream = stream
+        # Bind the stream methods once, since write() is called for every print
+        # in user code.
+        self._write = stream.write
+        self._writelines = stream.writelines
+        self._flush = stream.flush
 
     def write(self, data):
-        self.stream.write(data)
-        self.stream.flush()
+        self._write(data)
+        self._flush()
 
     def writelines(self, datas):
-        self.stream.writelines(datas)
-        self.stream.flush()
+        self._writelines(datas)
+        self._flush()
 
     def __getattr__(self, attr):
         return getattr(self.stream, attr)
@@ -431,6 +535,61 @@ def open_log(path, unbuffered=False, **kwargs):
         return stream
 
 
+# Files under the cgroup pseudo-filesystem aren't replaced while the process is
+# running, so their fds are kept open and re-read with pread(). This saves an
+# open()/close() pair per sample for files polled by the reporter agent, e.g.
+# memory.current.
+_CGROUP_FS_PREFIX = "/sys/fs/cgroup/"
+_CGROUP_FDS: Dict[str, int] = {}
+
+
+def _read_small_file(path: str) -> str:
+    """Return the stripped contents of a small (single value) file.
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist.
+    """
+    if not path.startswith(_CGROUP_FS_PREFIX):
+        with open(path, "r") as f:
+            return f.read().strip()
+
+    fd = _CGROUP_FDS.get(path)
+    if fd is None:
+        fd = os.open(path, os.O_RDONLY)
+        cached_fd = _CGROUP_FDS.setdefault(path, fd)
+        if cached_fd != fd:
+            # Another thread opened the file concurrently.
+            os.close(fd)
+            fd = cached_fd
+    try:
+        return os.pread(fd, 4096, 0).decode().strip()
+    except OSError:
+        # The fd went stale (e.g. its cgroup was removed). Drop it so that the
+        # next read reopens the file.
+        if _CGROUP_FDS.get(path) == fd:
+            del _CGROUP_FDS[path]
+            os.close(fd)
+        raise
+
+
+def _close_cgroup_fds():
+    """Close the fds cached by `_read_small_file`."""
+    while _CGROUP_FDS:
+        _, fd = _CGROUP_FDS.popitem()
+        os.close(fd)
+
+
+def _read_cgroup_file(path: str) -> Optional[str]:
+    """Return the stripped contents of a cgroup file, or None if it doesn't exist.
+
+    This avoids a separate `os.path.exists()` check before opening the file.
+    """
+    try:
+        return _read_small_file(path)
+    except FileNotFoundError:
+        return None
+
+
 def get_system_memory(
     # For cgroups v1:
     memory_limit_filename="/sys/fs/cgroup/memory/memory.limit_in_bytes",
@@ -446,18 +605,14 @@ def get_system_memory(
     # container. Note that this file is not specific to Docker and its value is
     # often much larger than the actual amount of memory.
     docker_limit = None
-    if os.path.exists(memory_limit_filename):
-        with open(memory_limit_filename, "r") as f:
-            docker_limit = int(f.read().strip())
-    elif os.path.exists(memory_limit_filename_v2):
-        with open(memory_limit_filename_v2, "r") as f:
-            # Don't forget to strip() the newline:
-            max_file = f.read().strip()
-            if max_file.isnumeric():
-                docker_limit = int(max_file)
-            else:
-                # max_file is "max", i.e. is unset.
-                docker_limit = None
+    memory_limit = _read_cgroup_file(memory_limit_filename)
+    if memory_limit is not None:
+        docker_limit = int(memory_limit)
+    else:
+        max_file = _read_cgroup_file(memory_limit_filename_v2)
+        if max_file is not None and max_file.isnumeric():
+            docker_limit = int(max_file)
+        # Otherwise max_file is "max", i.e. is unset.
 
     # Use psutil if it is available.
     psutil_memory_in_bytes = psutil.virtual_memory().total
@@ -470,6 +625,7 @@ def get_system_memory(
     return psutil_memory_in_bytes
 
 
+@functools.lru_cache(maxsize=1)
 def _get_docker_cpus(
     cpu_quota_file_name="/sys/fs/cgroup/cpu/cpu.cfs_quota_us",
     cpu_period_file_name="/sys/fs/cgroup/cpu/cpu.cfs_period_us",
@@ -484,28 +640,25 @@ def _get_docker_cpus(
     # docker, the number of vCPUs on a machine is whichever is set (ties broken
     # by smaller value).
 
+    # The result is cached since the cgroup cpu limits are fixed for the lifetime
+    # of the container. Use `_get_docker_cpus.cache_clear()` to invalidate it.
     cpu_quota = None
-    # See: https://bugs.openjdk.java.net/browse/JDK-8146115
-    if os.path.exists(cpu_quota_file_name) and os.path.exists(cpu_period_file_name):
-        try:
-            with open(cpu_quota_file_name, "r") as quota_file, open(
-                cpu_period_file_name, "r"
-            ) as period_file:
-                cpu_quota = float(quota_file.read()) / float(period_file.read())
-        except Exception:
-            logger.exception("Unexpected error calculating docker cpu quota.")
-    # Look at cpu.max for cgroups v2
-    elif os.path.exists(cpu_max_file_name):
-        try:
-            max_file = open(cpu_max_file_name).read()
-            quota_str, period_str = max_file.split()
-            if quota_str.isnumeric() and period_str.isnumeric():
-                cpu_quota = float(quota_str) / float(period_str)
-            else:
-                # quota_str is "max" meaning the cpu quota is unset
-                cpu_quota = None
-        except Exception:
-            logger.exception("Unexpected error calculating docker cpu quota.")
+    try:
+        # See: https://bugs.openjdk.java.net/browse/JDK-8146115
+        quota_str = _read_cgroup_file(cpu_quota_file_name)
+        period_str = _read_cgroup_file(cpu_period_file_name)
+        if quota_str is not None and period_str is not None:
+            cpu_quota = float(quota_str) / float(period_str)
+        else:
+            # Look at cpu.max for cgroups v2
+            max_file = _read_cgroup_file(cpu_max_file_name)
+            if max_file is not None:
+                quota_str, period_str = max_file.split()
+                if quota_str.isnumeric() and period_str.isnumeric():
+                    cpu_quota = float(quota_str) / float(period_str)
+                # Otherwise quota_str is "max" meaning the cpu quota is unset
+    except Exception:
+        logger.exception("Unexpected error calculating docker cpu quota.")
     if (cpu_quota is not None) and (cpu_quota < 0):
         cpu_quota = None
     elif cpu_quota == 0:
@@ -513,21 +666,20 @@ def _get_docker_cpus(
         cpu_quota = 1
 
     cpuset_num = None
-    if os.path.exists(cpuset_file_name):
-        try:
-            with open(cpuset_file_name) as cpuset_file:
-                ranges_as_string = cpuset_file.read()
-                ranges = ranges_as_string.split(",")
-                cpu_ids = []
-                for num_or_range in ranges:
-                    if "-" in num_or_range:
-                        start, end = num_or_range.split("-")
-                        cpu_ids.extend(list(range(int(start), int(end) + 1)))
-                    else:
-                        cpu_ids.append(int(num_or_range))
-                cpuset_num = len(cpu_ids)
-        except Exception:
-            logger.exception("Unexpected error calculating docker cpuset ids.")
+    try:
+        ranges_as_string = _read_cgroup_file(cpuset_file_name)
+        if ranges_as_string is not None:
+            # Count the cpu ids without materializing them, e.g. "0-10,20,50-63".
+            cpuset_num = 0
+            for num_or_range in ranges_as_string.split(","):
+                if "-" in num_or_range:
+                    start, end = num_or_range.split("-")
+                    cpuset_num += int(end) - int(start) + 1
+                else:
+                    int(num_or_range)  # Validate the cpu id.
+                    cpuset_num += 1
+    except Exception:
+        logger.exception("Unexpected error calculating docker cpuset ids.")
     # Possible to-do: Parse cgroups v2's cpuset.cpus.effective for the number
     # of accessible CPUs.
 
@@ -601,46 +753,41 @@ def get_num_cpus(
     return cpu_count
 
 
+def _read_cgroup_memory_stat(filename: str) -> Dict[str, str]:
+    """Parse a cgroup memory.stat file into a dict of key -> unparsed value."""
+    stats = {}
+    with open(filename, "r") as f:
+        for line in f:
+            key, _, value = line.partition(" ")
+            stats[key] = value
+    return stats
+
+
 # TODO(clarng): merge code with c++
 def get_cgroupv1_used_memory(filename):
-    with open(filename, "r") as f:
-        lines = f.readlines()
-        cache_bytes = -1
-        rss_bytes = -1
-        inactive_file_bytes = -1
-        working_set = -1
-        for line in lines:
-            if "total_rss " in line:
-                rss_bytes = int(line.split()[1])
-            elif "cache " in line:
-                cache_bytes = int(line.split()[1])
-            elif "inactive_file" in line:
-                inactive_file_bytes = int(line.split()[1])
-        if cache_bytes >= 0 and rss_bytes >= 0 and inactive_file_bytes >= 0:
-            working_set = rss_bytes + cache_bytes - inactive_file_bytes
-            assert working_set >= 0
-            return working_set
-        return None
+    stats = _read_cgroup_memory_stat(filename)
+    rss_bytes = int(stats.get("total_rss", -1))
+    cache_bytes = int(stats.get("total_cache", -1))
+    inactive_file_bytes = int(stats.get("total_inactive_file", -1))
+    if cache_bytes >= 0 and rss_bytes >= 0 and inactive_file_bytes >= 0:
+        working_set = rss_bytes + cache_bytes - inactive_file_bytes
+        assert working_set >= 0
+        return working_set
+    return None
 
 
 def get_cgroupv2_used_memory(stat_file, usage_file):
     # Uses same calculation as libcontainer, that is:
     # memory.current - memory.stat[inactive_file]
     # Source: https://github.com/google/cadvisor/blob/24dd1de08a72cfee661f6178454db995900c0fee/container/libcontainer/handler.go#L836  # noqa: E501
-    inactive_file_bytes = -1
-    current_usage = -1
-    with open(usage_file, "r") as f:
-        current_usage = int(f.read().strip())
-    with open(stat_file, "r") as f:
-        lines = f.readlines()
-        for line in lines:
-            if "inactive_file" in line:
-                inactive_file_bytes = int(line.split()[1])
-        if current_usage >= 0 and inactive_file_bytes >= 0:
-            working_set = current_usage - inactive_file_bytes
-            assert working_set >= 0
-            return working_set
-        return None
+    current_usage = int(_read_small_file(usage_file))
+    stats = _read_cgroup_memory_stat(stat_file)
+    inactive_file_bytes = int(stats.get("inactive_file", -1))
+    if current_usage >= 0 and inactive_file_bytes >= 0:
+        working_set = current_usage - inactive_file_bytes
+        assert working_set >= 0
+        return working_set
+    return None
 
 
 def get_used_memory():
@@ -657,14 +804,15 @@ def get_used_memory():
     # For cgroups v2:
     memory_usage_filename_v2 = "/sys/fs/cgroup/memory.current"
     memory_stat_filename_v2 = "/sys/fs/cgroup/memory.stat"
-    if os.path.exists(memory_usage_filename):
+    try:
         docker_usage = get_cgroupv1_used_memory(memory_usage_filename)
-    elif os.path.exists(memory_usage_filename_v2) and os.path.exists(
-        memory_stat_filename_v2
-    ):
-        docker_usage = get_cgroupv2_used_memory(
-            memory_stat_filename_v2, memory_usage_filename_v2
-        )
+    except FileNotFoundError:
+        try:
+            docker_usage = get_cgroupv2_used_memory(
+                memory_stat_filename_v2, memory_usage_filename_v2
+            )
+        except FileNotFoundError:
+            pass
 
     if docker_usage is not None:
         return docker_usage
@@ -689,7 +837,7 @@ def get_shared_memory_bytes():
         The size of the shared memory file system in bytes.
     """
     # Make sure this is only called on Linux.
-    assert sys.platform == "linux" or sys.platform == "linux2"
+    assert _IS_LINUX
 
     shm_fd = os.open("/dev/shm", os.O_RDONLY)
     try:
@@ -704,6 +852,12 @@ def get_shared_memory_bytes():
     return shm_avail
 
 
+# Bound at import so that the common (small function) path of
+# check_oversized_function doesn't look them up on ray_constants every call.
+_FUNCTION_SIZE_WARN_THRESHOLD = ray_constants.FUNCTION_SIZE_WARN_THRESHOLD
+_FUNCTION_SIZE_ERROR_THRESHOLD = ray_constants.FUNCTION_SIZE_ERROR_THRESHOLD
+
+
 def check_oversized_function(
     pickled: bytes, name: str, obj_type: str, worker: "ray.Worker"
 ) -> None:
@@ -718,9 +872,9 @@ def check_oversized_function(
             locally if None.
     """
     length = len(pickled)
-    if length <= ray_constants.FUNCTION_SIZE_WARN_THRESHOLD:
+    if length <= _FUNCTION_SIZE_WARN_THRESHOLD:
         return
-    elif length < ray_constants.FUNCTION_SIZE_ERROR_THRESHOLD:
+    elif length < _FUNCTION_SIZE_ERROR_THRESHOLD:
         warning_message = (
             "The {} {} is very large ({} MiB). "
             "Check that its definition is not implicitly capturing a large "
@@ -744,20 +898,18 @@ def check_oversized_function(
             obj_type,
             name,
             length // (1024 * 1024),
-            ray_constants.FUNCTION_SIZE_ERROR_THRESHOLD // (1024 * 1024),
+            _FUNCTION_SIZE_ERROR_THRESHOLD // (1024 * 1024),
         )
         raise ValueError(error)
 
 
 def is_main_thread():
-    return threading.current_thread().getName() == "MainThread"
+    return threading.current_thread() is threading.main_thread()
 
 
 def detect_fate_sharing_support_win32():
     global win32_job, win32_AssignProcessToJobObject
-    if win32_job is None and sys.platform == "win32":
-        import ctypes
-
+    if win32_job is None and _IS_WIN32:
         try:
             from ctypes.wintypes import BOOL, DWORD, HANDLE, LPCWSTR, LPVOID
 
@@ -839,7 +991,7 @@ def detect_fate_sharing_support_win32():
 
 def detect_fate_sharing_support_linux():
     global linux_prctl
-    if linux_prctl is None and sys.platform.startswith("linux"):
+    if linux_prctl is None and _IS_LINUX:
         try:
             from ctypes import CDLL, c_int, c_ulong
 
@@ -852,11 +1004,13 @@ def detect_fate_sharing_support_linux():
     return bool(linux_prctl)
 
 
+@functools.lru_cache(maxsize=None)
 def detect_fate_sharing_support():
+    # The platform support can't change at runtime, so the result is cached.
     result = None
-    if sys.platform == "win32":
+    if _IS_WIN32:
         result = detect_fate_sharing_support_win32()
-    elif sys.platform.startswith("linux"):
+    elif _IS_LINUX:
         result = detect_fate_sharing_support_linux()
     return result
 
@@ -867,12 +1021,8 @@ def set_kill_on_parent_death_linux():
     Linux-only. Must be called in preexec_fn (i.e. by the child).
     """
     if detect_fate_sharing_support_linux():
-        import signal
-
         PR_SET_PDEATHSIG = 1
         if linux_prctl(PR_SET_PDEATHSIG, signal.SIGKILL, 0, 0, 0) != 0:
-            import ctypes
-
             raise OSError(ctypes.get_errno(), "prctl(PR_SET_PDEATHSIG) failed")
     else:
         assert False, "PR_SET_PDEATHSIG used despite being unavailable"
@@ -893,8 +1043,6 @@ def set_kill_child_on_death_win32(child_proc):
 
     if detect_fate_sharing_support_win32():
         if not win32_AssignProcessToJobObject(win32_job, int(child_proc)):
-            import ctypes
-
             raise OSError(ctypes.get_last_error(), "AssignProcessToJobObject() failed")
     else:
         assert False, "AssignProcessToJobObject used despite being unavailable"
@@ -902,7 +1050,7 @@ def set_kill_child_on_death_win32(child_proc):
 
 def set_sigterm_handler(sigterm_handler):
     """Registers a handler for SIGTERM in a platform-compatible manner."""
-    if sys.platform == "win32":
+    if _IS_WIN32:
         # Note that these signal handlers only work for console applications.
         # TODO(mehrdadn): implement graceful process termination mechanism
         # SIGINT is Ctrl+C, SIGBREAK is Ctrl+Break.
@@ -933,6 +1081,18 @@ def try_to_create_directory(directory_path):
         directory_path: The path of the directory to create.
     """
     directory_path = os.path.expanduser(directory_path)
+    try:
+        st = os.stat(directory_path)
+    except OSError:
+        st = None
+    if (
+        st is not None
+        and stat.S_ISDIR(st.st_mode)
+        and stat.S_IMODE(st.st_mode) & 0o777 == 0o777
+    ):
+        # Fast path: the directory already exists and is already shared, so
+        # skip the makedirs() and chmod() syscalls.
+        return
     os.makedirs(directory_path, exist_ok=True)
     # Change the log directory permissions so others can use it. This is
     # important when multiple people are using the same machine.
@@ -953,22 +1113,35 @@ def try_to_symlink(symlink_path, target_path):
     symlink_path = os.path.expanduser(symlink_path)
     target_path = os.path.expanduser(target_path)
 
-    if os.path.exists(symlink_path):
-        if os.path.islink(symlink_path):
-            # Try to remove existing symlink.
-            try:
-                os.remove(symlink_path)
-            except OSError:
-                return
-        else:
-            # There's an existing non-symlink file, don't overwrite it.
-            return
-
+    # Optimistically create the symlink, which is the common case.
     try:
         os.symlink(target_path, symlink_path)
+        return
+    except FileExistsError:
+        pass
     except OSError:
         return
 
+    try:
+        st = os.lstat(symlink_path)
+    except OSError:
+        return
+    if not stat.S_ISLNK(st.st_mode):
+        # There's an existing non-symlink file, don't overwrite it.
+        return
+
+    # Replace the existing (possibly broken) symlink atomically, so that there
+    # is no window in which the symlink path doesn't exist.
+    tmp_symlink_path = f"{symlink_path}.{os.getpid()}.tmp"
+    try:
+        os.symlink(target_path, tmp_symlink_path)
+        os.replace(tmp_symlink_path, symlink_path)
+    except OSError:
+        try:
+            os.remove(tmp_symlink_path)
+        except OSError:
+            pass
+
 
 def get_user():
     if pwd is None:
@@ -979,9 +1152,24 @@ def get_user():
         return ""
 
 
+# Cache of callable -> parameter names for get_function_args(), since
+# inspect.signature() is expensive.
+_FUNCTION_ARGS_CACHE = weakref.WeakKeyDictionary()
+
+
 def get_function_args(callable):
-    all_parameters = frozenset(signature(callable).parameters)
-    return list(all_parameters)
+    try:
+        parameters = _FUNCTION_ARGS_CACHE.get(callable)
+    except TypeError:
+        # The callable can't be weakly referenced or isn't hashable.
+        parameters = None
+    if parameters is None:
+        parameters = tuple(signature(callable).parameters)
+        try:
+            _FUNCTION_ARGS_CACHE[callable] = parameters
+        except TypeError:
+            pass
+    return list(parameters)
 
 
 def get_conda_bin_executable(executable_name):
@@ -990,10 +1178,16 @@ def get_conda_bin_executable(executable_name):
     the 'bin' subdirectory of a conda installation.  Adapted from
     https://github.com/mlflow/mlflow.
     """
-
     # Use CONDA_EXE as per https://github.com/conda/conda/issues/7126
-    if "CONDA_EXE" in os.environ:
-        conda_bin_dir = os.path.dirname(os.environ["CONDA_EXE"])
+    return _resolve_conda_bin_executable(executable_name, os.environ.get("CONDA_EXE"))
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_conda_bin_executable(
+    executable_name: str, conda_exe: Optional[str]
+) -> str:
+    if conda_exe is not None:
+        conda_bin_dir = os.path.dirname(conda_exe)
         return os.path.join(conda_bin_dir, executable_name)
     return executable_name
 
@@ -1005,12 +1199,27 @@ def get_conda_env_dir(env_name):
     the existence of the corresponding conda directory, e.g.
     `/Users/scaly/anaconda3/envs/tf1`, and returns it.
     """
-    conda_prefix = os.environ.get("CONDA_PREFIX")
+    return _resolve_conda_env_dir(
+        env_name,
+        os.environ.get("CONDA_PREFIX"),
+        os.environ.get("CONDA_EXE"),
+        os.environ.get("CONDA_DEFAULT_ENV"),
+    )
+
+
+# Cached by the conda environment variables the result depends on. Only found
+# environments are cached, since a missing one raises.
+@functools.lru_cache(maxsize=None)
+def _resolve_conda_env_dir(
+    env_name: str,
+    conda_prefix: Optional[str],
+    conda_exe: Optional[str],
+    conda_default_env: Optional[str],
+) -> str:
     if conda_prefix is None:
         # The caller is neither in a conda env or in (base) env.  This is rare
         # because by default, new terminals start in (base), but we can still
         # support this case.
-        conda_exe = os.environ.get("CONDA_EXE")
         if conda_exe is None:
             raise ValueError(
                 "Cannot find environment variables set by conda. "
@@ -1025,7 +1234,7 @@ def get_conda_env_dir(env_name):
     #    CONDA_PREFIX=$HOME/anaconda3
     # 2. We are in a user-created conda env: CONDA_DEFAULT_ENV=$env_name and
     #    CONDA_PREFIX=$HOME/anaconda3/envs/$current_env_name
-    if os.environ.get("CONDA_DEFAULT_ENV") == "base":
+    if conda_default_env == "base":
         # Caller's curent environment is (base).
         # Not recommended by conda, but we can still support it.
         if env_name == "base":
@@ -1039,14 +1248,12 @@ def get_conda_env_dir(env_name):
         # Now `conda_prefix` should be something like
         # $HOME/anaconda3/envs/$current_env_name
         # We want to replace the last component with the desired env name.
-        conda_envs_dir = os.path.split(conda_prefix)[0]
+        conda_envs_dir = os.path.dirname(conda_prefix)
         env_dir = os.path.join(conda_envs_dir, env_name)
     if not os.path.isdir(env_dir):
         raise ValueError(
-            "conda env "
-            + env_name
-            + " not found in conda envs directory. Run `conda env list` to "
-            + "verify the name is correct."
+            f"conda env {env_name} not found in conda envs directory. Run "
+            "`conda env list` to verify the name is correct."
         )
     return env_dir
 
@@ -1060,29 +1267,33 @@ def get_call_location(back: int = 1):
         back: The number of frames to go up the stack, not including this
             function.
     """
-    stack = inspect.stack()
+    # sys._getframe() avoids inspect.stack(), which reads the source context
+    # of every frame on the stack.
     try:
-        frame = stack[back + 1]
-        return f"{frame.filename}:{frame.lineno}"
-    except IndexError:
+        frame = sys._getframe(back + 1)
+    except ValueError:
         return "UNKNOWN"
+    return f"{frame.f_code.co_filename}:{frame.f_lineno}"
 
 
-def get_ray_doc_version():
-    """Get the docs.ray.io version corresponding to the ray.__version__."""
+def _compute_ray_doc_version() -> str:
     # The ray.__version__ can be official Ray release (such as 1.12.0), or
     # dev (3.0.0dev0) or release candidate (2.0.0rc0). For the later we map
     # to the master doc version at docs.ray.io.
-    if re.match(r"^\d+\.\d+\.\d+$", ray.__version__) is None:
+    if re.fullmatch(r"\d+\.\d+\.\d+", ray.__version__) is None:
         return "master"
     # For the former (official Ray release), we have corresponding doc version
     # released as well.
     return f"releases-{ray.__version__}"
 
 
-# Used to only print a deprecation warning once for a given function if we
-# don't wish to spam the caller.
-_PRINTED_WARNING = set()
+# ray.__version__ is fixed at import time, so the doc version is too.
+_RAY_DOC_VERSION = _compute_ray_doc_version()
+
+
+def get_ray_doc_version():
+    """Get the docs.ray.io version corresponding to the ray.__version__."""
+    return _RAY_DOC_VERSION
 
 
 # The following is inspired by
@@ -1123,12 +1334,16 @@ def deprecated(
         )
 
     def deprecated_wrapper(func):
+        # Used to only print the deprecation warning once for this function if
+        # we don't wish to spam the caller.
+        warned = False
+
         @functools.wraps(func)
         def new_func(*args, **kwargs):
-            global _PRINTED_WARNING
-            if func not in _PRINTED_WARNING:
+            nonlocal warned
+            if not warned:
                 if warn_once:
-                    _PRINTED_WARNING.add(func)
+                    warned = True
                 msg = (
                     "From {}: {} (from {}) is deprecated and will ".format(
                         get_call_location(), func.__name__, func.__module__
@@ -1151,6 +1366,31 @@ def deprecated(
     return deprecated_wrapper
 
 
+def _split_import_path(full_path: str) -> Tuple[str, str]:
+    if ":" in full_path:
+        module_name, _, attr_name = full_path.partition(":")
+        if ":" in attr_name:
+            raise ValueError(
+                f'Got invalid import path "{full_path}". An '
+                "import path may have at most one colon."
+            )
+    else:
+        module_name, sep, attr_name = full_path.rpartition(".")
+        if not sep:
+            raise ModuleNotFoundError(
+                f'Got invalid import path "{full_path}". An import path must '
+                'include a module, e.g. "module.attr" or "module:attr".',
+                name=full_path,
+            )
+    return module_name, attr_name
+
+
+@functools.lru_cache(maxsize=1024)
+def _import_attr_cached(full_path: str):
+    module_name, attr_name = _split_import_path(full_path)
+    return getattr(importlib.import_module(module_name), attr_name)
+
+
 def import_attr(full_path: str, *, reload_module: bool = False):
     """Given a full import path to a module attr, return the imported attr.
 
@@ -1167,24 +1407,36 @@ def import_attr(full_path: str, *, reload_module: bool = False):
     if full_path is None:
         raise TypeError("import path cannot be None")
 
-    if ":" in full_path:
-        if full_path.count(":") > 1:
-            raise ValueError(
-                f'Got invalid import path "{full_path}". An '
-                "import path may have at most one colon."
-            )
-        module_name, attr_name = full_path.split(":")
-    else:
-        last_period_idx = full_path.rfind(".")
-        module_name = full_path[:last_period_idx]
-        attr_name = full_path[last_period_idx + 1 :]
+    if not reload_module:
+        return _import_attr_cached(full_path)
 
+    module_name, attr_name = _split_import_path(full_path)
     module = importlib.import_module(module_name)
-    if reload_module:
-        importlib.reload(module)
+    importlib.reload(module)
+    # Attrs cached before the reload may now be stale.
+    _import_attr_cached.cache_clear()
     return getattr(module, attr_name)
 
 
+# The platform part of the wheel filename, keyed by sys.platform and then by
+# architecture. The None entry is used for all other architectures.
+_WHEEL_OS_STRINGS = {
+    "darwin": {"arm64": "macosx_11_0_arm64", None: "macosx_10_15_x86_64"},
+    "linux": {"aarch64": "manylinux2014_aarch64", None: "manylinux2014_x86_64"},
+    "win32": {None: "win_amd64"},
+}
+# Python versions that have macOS arm64 wheels.
+_DARWIN_ARM64_PY_VERSIONS = frozenset(["311", "310", "39", "38"])
+
+
+@functools.lru_cache(maxsize=1)
+def _default_architecture() -> str:
+    # platform.processor() may shell out (e.g. to `uname -p`), so only call it
+    # once per process.
+    return platform.processor()
+
+
+@functools.lru_cache(maxsize=None)
 def get_wheel_filename(
     sys_platform: str = sys.platform,
     ray_version: str = ray.__version__,
@@ -1211,35 +1463,25 @@ def get_wheel_filename(
 
     py_version_str = "".join(map(str, py_version))
 
-    architecture = architecture or platform.processor()
+    architecture = architecture or _default_architecture()
 
-    if py_version_str in ["311", "310", "39", "38"] and architecture == "arm64":
-        darwin_os_string = "macosx_11_0_arm64"
+    os_strings = _WHEEL_OS_STRINGS.get(sys_platform)
+    assert os_strings is not None, sys_platform
+    if sys_platform == "darwin" and py_version_str not in _DARWIN_ARM64_PY_VERSIONS:
+        os_string = os_strings[None]
     else:
-        darwin_os_string = "macosx_10_15_x86_64"
-
-    if architecture == "aarch64":
-        linux_os_string = "manylinux2014_aarch64"
-    else:
-        linux_os_string = "manylinux2014_x86_64"
-
-    os_strings = {
-        "darwin": darwin_os_string,
-        "linux": linux_os_string,
-        "win32": "win_amd64",
-    }
-
-    assert sys_platform in os_strings, sys_platform
+        os_string = os_strings.get(architecture, os_strings[None])
 
     wheel_filename = (
         f"ray-{ray_version}-cp{py_version_str}-"
         f"cp{py_version_str}{'m' if py_version_str in ['37'] else ''}"
-        f"-{os_strings[sys_platform]}.whl"
+        f"-{os_string}.whl"
     )
 
     return wheel_filename
 
 
+@functools.lru_cache(maxsize=None)
 def get_master_wheel_url(
     ray_commit: str = ray.__commit__,
     sys_platform: str = sys.platform,
@@ -1256,6 +1498,7 @@ def get_master_wheel_url(
     )
 
 
+@functools.lru_cache(maxsize=None)
 def get_release_wheel_url(
     ray_commit: str = ray.__commit__,
     sys_platform: str = sys.platform,
@@ -1296,19 +1539,22 @@ def init_grpc_channel(
     except ImportError:
         from grpc.experimental import aio as aiogrpc
 
-    from ray._private.tls_utils import load_certs_from_env
-
     grpc_module = aiogrpc if asynchronous else grpc
 
-    options = options or []
-    options_dict = dict(options)
-    options_dict["grpc.keepalive_time_ms"] = options_dict.get(
-        "grpc.keepalive_time_ms", ray._config.grpc_client_keepalive_time_ms()
-    )
-    options_dict["grpc.keepalive_timeout_ms"] = options_dict.get(
-        "grpc.keepalive_timeout_ms", ray._config.grpc_client_keepalive_timeout_ms()
-    )
-    options = options_dict.items()
+    options = list(options) if options else []
+    # Only fetch the keepalive defaults when the caller didn't set them.
+    option_keys = {key for key, _ in options}
+    if "grpc.keepalive_time_ms" not in option_keys:
+        options.append(
+            ("grpc.keepalive_time_ms", ray._config.grpc_client_keepalive_time_ms())
+        )
+    if "grpc.keepalive_timeout_ms" not in option_keys:
+        options.append(
+            (
+                "grpc.keepalive_timeout_ms",
+                ray._config.grpc_client_keepalive_timeout_ms(),
+            )
+        )
 
     if os.environ.get("RAY_USE_TLS", "0").lower() in ("1", "true"):
         server_cert_chain, private_key, ca_cert = load_certs_from_env()
@@ -1363,20 +1609,39 @@ connect_error = (
 )
 
 
+@functools.lru_cache(maxsize=1)
+def _transient_rpc_codes() -> FrozenSet[int]:
+    # Resolved lazily because ray._raylet imports this module.
+    return frozenset(
+        (
+            ray._raylet.GRPC_STATUS_CODE_UNAVAILABLE,
+            ray._raylet.GRPC_STATUS_CODE_UNKNOWN,
+        )
+    )
+
+
+def _is_transient_rpc_error(e: Exception) -> bool:
+    return (
+        isinstance(e, ray.exceptions.RpcError) and e.rpc_code in _transient_rpc_codes()
+    )
+
+
+def _internal_kv_retry_delay_s(attempt: int) -> float:
+    # Exponential backoff so a GCS that comes up quickly is picked up sooner.
+    return min(0.1 * 2**attempt, 2.0)
+
+
 def internal_kv_list_with_retry(gcs_client, prefix, namespace, num_retries=20):
     result = None
     if isinstance(prefix, str):
         prefix = prefix.encode()
     if isinstance(namespace, str):
         namespace = namespace.encode()
-    for _ in range(num_retries):
+    for attempt in range(num_retries):
         try:
             result = gcs_client.internal_kv_keys(prefix, namespace)
         except Exception as e:
-            if isinstance(e, ray.exceptions.RpcError) and e.rpc_code in (
-                ray._raylet.GRPC_STATUS_CODE_UNAVAILABLE,
-                ray._raylet.GRPC_STATUS_CODE_UNKNOWN,
-            ):
+            if _is_transient_rpc_error(e):
                 logger.warning(connect_error.format(gcs_client.address))
             else:
                 logger.exception("Internal KV List failed")
@@ -1386,7 +1651,7 @@ def internal_kv_list_with_retry(gcs_client, prefix, namespace, num_retries=20):
             break
         else:
             logger.debug(f"Fetched {prefix}=None from KV. Retrying.")
-            time.sleep(2)
+            time.sleep(_internal_kv_retry_delay_s(attempt))
     if result is None:
         raise ConnectionError(
             f"Could not list '{prefix}' from GCS. Did GCS start successfully?"
@@ -1398,14 +1663,11 @@ def internal_kv_get_with_retry(gcs_client, key, namespace, num_retries=20):
     result = None
     if isinstance(key, str):
         key = key.encode()
-    for _ in range(num_retries):
+    for attempt in range(num_retries):
         try:
             result = gcs_client.internal_kv_get(key, namespace)
         except Exception as e:
-            if isinstance(e, ray.exceptions.RpcError) and e.rpc_code in (
-                ray._raylet.GRPC_STATUS_CODE_UNAVAILABLE,
-                ray._raylet.GRPC_STATUS_CODE_UNKNOWN,
-            ):
+            if _is_transient_rpc_error(e):
                 logger.warning(connect_error.format(gcs_client.address))
             else:
                 logger.exception("Internal KV Get failed")
@@ -1415,7 +1677,7 @@ def internal_kv_get_with_retry(gcs_client, key, namespace, num_retries=20):
             break
         else:
             logger.debug(f"Fetched {key}=None from KV. Retrying.")
-            time.sleep(2)
+            time.sleep(_internal_kv_retry_delay_s(attempt))
     if not result:
         raise ConnectionError(
             f"Could not read '{key.decode()}' from GCS. Did GCS start successfully?"
@@ -1473,20 +1735,17 @@ def internal_kv_put_with_retry(gcs_client, key, value, namespace, num_retries=20
     if isinstance(namespace, str):
         namespace = namespace.encode()
     error = None
-    for _ in range(num_retries):
+    for attempt in range(num_retries):
         try:
             return gcs_client.internal_kv_put(
                 key, value, overwrite=True, namespace=namespace
             )
         except ray.exceptions.RpcError as e:
-            if e.rpc_code in (
-                ray._raylet.GRPC_STATUS_CODE_UNAVAILABLE,
-                ray._raylet.GRPC_STATUS_CODE_UNKNOWN,
-            ):
+            if e.rpc_code in _transient_rpc_codes():
                 logger.warning(connect_error.format(gcs_client.address))
             else:
                 logger.exception("Internal KV Put failed")
-            time.sleep(2)
+            time.sleep(_internal_kv_retry_delay_s(attempt))
             error = e
     # Reraise the last error.
     raise error
@@ -1506,12 +1765,29 @@ def compute_version_info():
 def get_directory_size_bytes(path: Union[str, Path] = ".") -> int:
     """Get the total size of a directory in bytes, including subdirectories."""
     total_size_bytes = 0
-    for dirpath, dirnames, filenames in os.walk(path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            # skip if it is a symbolic link or a .pyc file
-            if not os.path.islink(fp) and not f.endswith(".pyc"):
-                total_size_bytes += os.path.getsize(fp)
+    # Walk the tree with os.scandir() directly, so that the file type and size
+    # come from the cached directory entries instead of additional
+    # islink()/getsize() calls per file. Scanning bytes paths makes the entry
+    # names bytes, which skips decoding them.
+    dirs_to_scan = [os.fsencode(path)]
+    while dirs_to_scan:
+        try:
+            entries = os.scandir(dirs_to_scan.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    # Symlinked directories are not followed, like os.walk().
+                    if entry.is_dir(follow_symlinks=False):
+                        # __pycache__ only holds .pyc files, which are skipped.
+                        if entry.name != b"__pycache__":
+                            dirs_to_scan.append(entry.path)
+                    # skip if it is a symbolic link or a .pyc file
+                    elif not entry.is_symlink() and not entry.name.endswith(b".pyc"):
+                        total_size_bytes += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
 
     return total_size_bytes
 
@@ -1644,34 +1920,35 @@ def split_address(address: str) -> Tuple[str, str]:
         >>> split_address("ray://my_cluster")
         ('ray', 'my_cluster')
     """
-    if "://" not in address:
+    module_string, sep, inner_address = address.partition("://")
+    if not sep:
         raise ValueError("Address must contain '://'")
 
-    module_string, inner_address = address.split("://", maxsplit=1)
     return (module_string, inner_address)
 
 
-def get_or_create_event_loop() -> asyncio.BaseEventLoop:
-    """Get a running async event loop if one exists, otherwise create one.
+# The Python version can't change within a process, so the implementation is
+# picked once at import instead of checking sys.version_info on every call.
+if sys.version_info >= (3, 10):
 
-    This function serves as a proxy for the deprecating get_event_loop().
-    It tries to get the running loop first, and if no running loop
-    could be retrieved:
-    - For python version <3.10: it falls back to the get_event_loop
-        call.
-    - For python version >= 3.10: it uses the same python implementation
-        of _get_event_loop() at asyncio/events.py.
+    def get_or_create_event_loop() -> asyncio.BaseEventLoop:
+        """Get a running async event loop if one exists, otherwise create one.
 
-    Ideally, one should use high level APIs like asyncio.run() with python
-    version >= 3.7, if not possible, one should create and manage the event
-    loops explicitly.
-    """
-    vers_info = sys.version_info
-    if vers_info.major >= 3 and vers_info.minor >= 10:
+        This function serves as a proxy for the deprecating get_event_loop().
+        It tries to get the running loop first, and if no running loop
+        could be retrieved:
+        - For python version <3.10: it falls back to the get_event_loop
+            call.
+        - For python version >= 3.10: it uses the same python implementation
+            of _get_event_loop() at asyncio/events.py.
+
+        Ideally, one should use high level APIs like asyncio.run() with python
+        version >= 3.7, if not possible, one should create and manage the event
+        loops explicitly.
+        """
         # This follows the implementation of the deprecating `get_event_loop`
         # in python3.10's asyncio. See python3.10/asyncio/events.py
         # _get_event_loop()
-        loop = None
         try:
             loop = asyncio.get_running_loop()
             assert loop is not None
@@ -1682,11 +1959,23 @@ def get_or_create_event_loop() -> asyncio.BaseEventLoop:
             assert "no running event loop" in str(e)
             return asyncio.get_event_loop_policy().get_event_loop()
 
-    return asyncio.get_event_loop()
+else:
 
+    def get_or_create_event_loop() -> asyncio.BaseEventLoop:
+        """Get a running async event loop if one exists, otherwise create one.
 
+        See the python >= 3.10 definition above for details.
+        """
+        return asyncio.get_event_loop()
+
+
+@functools.lru_cache(maxsize=1)
 def get_entrypoint_name():
-    """Get the entrypoint of the current script."""
+    """Get the entrypoint of the current script.
+
+    The result is cached, since the entrypoint doesn't change over the lifetime of
+    the process.
+    """
     prefix = ""
     try:
         curr = psutil.Process()
@@ -1700,6 +1989,20 @@ def get_entrypoint_name():
         return "unknown"
 
 
+def _to_json_friendly_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    # bool and dict values should be converted to json-friendly values.
+    json_friendly_params = {}
+    for k, v in params.items():
+        if v is True:
+            v = "true"
+        elif v is False:
+            v = "false"
+        elif isinstance(v, dict):
+            v = json.dumps(v)
+        json_friendly_params[k] = v
+    return json_friendly_params
+
+
 def _add_url_query_params(url: str, params: Dict[str, str]) -> str:
     """Add params to the provided url as query parameters.
 
@@ -1713,31 +2016,50 @@ def _add_url_query_params(url: str, params: Dict[str, str]) -> str:
     Returns:
         URL with params added as query parameters.
     """
+    if "?" not in url and "#" not in url and "%" not in url:
+        # Fast path: there are no existing args to merge and nothing to unquote, so
+        # the query string can be appended directly.
+        if not params:
+            return url
+        return f"{url}?{urlencode(_to_json_friendly_params(params), doseq=True)}"
+
     # Unquote URL first so we don't lose existing args.
     url = unquote(url)
     # Parse URL.
     parsed_url = urlparse(url)
-    # Merge URL query string arguments dict with new params.
-    base_params = params
-    params = dict(parse_qsl(parsed_url.query))
-    base_params.update(params)
-    # bool and dict values should be converted to json-friendly values.
-    base_params.update(
-        {
-            k: json.dumps(v)
-            for k, v in base_params.items()
-            if isinstance(v, (bool, dict))
-        }
-    )
+    # Merge URL query string arguments with new params, with the existing args
+    # taking precedence. Existing args are kept as (key, value) pairs so repeated and
+    # blank args survive the round trip.
+    existing_params = parse_qsl(parsed_url.query, keep_blank_values=True)
+    existing_keys = {k for k, _ in existing_params}
+    merged_params = [
+        (k, v)
+        for k, v in _to_json_friendly_params(params).items()
+        if k not in existing_keys
+    ]
+    merged_params.extend(existing_params)
 
     # Convert URL arguments to proper query string.
-    encoded_params = urlencode(base_params, doseq=True)
+    encoded_params = urlencode(merged_params, doseq=True)
     # Replace query string in parsed URL with updated query string.
     parsed_url = parsed_url._replace(query=encoded_params)
     # Convert back to URL.
     return urlunparse(parsed_url)
 
 
+@functools.lru_cache(maxsize=1)
+def _pyarrow_requires_bucket_creation_param() -> bool:
+    """Whether S3 URIs need allow_bucket_creation=true, i.e. pyarrow >= 9.0.0.
+
+    Also True if pyarrow isn't installed.
+    """
+    pyarrow_version = _get_pyarrow_version()
+    if pyarrow_version is None:
+        return True
+    # This bucket creation query parameter is not required for pyarrow < 9.0.0.
+    return parse_version(pyarrow_version) >= parse_version("9.0.0")
+
+
 def _add_creatable_buckets_param_if_s3_uri(uri: str) -> str:
     """If the provided URI is an S3 URL, add allow_bucket_creation=true as a query
     parameter. For pyarrow >= 9.0.0, this is required in order to allow
@@ -1753,18 +2075,16 @@ def _add_creatable_buckets_param_if_s3_uri(uri: str) -> str:
         A URI with the added allow_bucket_creation=true query parameter, if the provided
         URI is an S3 URL; uri will be returned unchanged otherwise.
     """
-    from packaging.version import parse as parse_version
-
-    pyarrow_version = _get_pyarrow_version()
-    if pyarrow_version is not None:
-        pyarrow_version = parse_version(pyarrow_version)
-    if pyarrow_version is not None and pyarrow_version < parse_version("9.0.0"):
-        # This bucket creation query parameter is not required for pyarrow < 9.0.0.
+    if not _pyarrow_requires_bucket_creation_param():
+        return uri
+    if uri.startswith("s3://"):
+        # Fast path for the common case of a plain S3 URI. URIs with query args,
+        # fragments or percent-escapes still go through _add_url_query_params.
+        if "?" not in uri and "#" not in uri and "%" not in uri:
+            return uri + "?allow_bucket_creation=true"
+    elif urlparse(uri).scheme != "s3":
         return uri
-    parsed_uri = urlparse(uri)
-    if parsed_uri.scheme == "s3":
-        uri = _add_url_query_params(uri, {"allow_bucket_creation": True})
-    return uri
+    return _add_url_query_params(uri, {"allow_bucket_creation": True})
 
 
 def _get_pyarrow_version() -> Optional[str]:
@@ -1772,15 +2092,14 @@ def _get_pyarrow_version() -> Optional[str]:
     Returns None if the package is not found.
     """
     global _PYARROW_VERSION
-    if _PYARROW_VERSION is None:
+    if _PYARROW_VERSION is _PYARROW_UNSET:
         try:
             import pyarrow
         except ModuleNotFoundError:
             # pyarrow not installed, short-circuit.
-            pass
+            _PYARROW_VERSION = None
         else:
-            if hasattr(pyarrow, "__version__"):
-                _PYARROW_VERSION = pyarrow.__version__
+            _PYARROW_VERSION = getattr(pyarrow, "__version__", None)
     return _PYARROW_VERSION
 
 
@@ -1794,15 +2113,13 @@ class DeferSigint(contextlib.AbstractContextManager):
         self.task_cancelled = False
         # The original SIGINT handler.
         self.orig_sigint_handler = None
-        # The original signal method.
-        self.orig_signal = None
 
     @classmethod
     def create_if_main_thread(cls) -> contextlib.AbstractContextManager:
         """Creates a DeferSigint context manager if running on the main thread,
         returns a no-op context manager otherwise.
         """
-        if threading.current_thread() == threading.main_thread():
+        if is_main_thread():
             return cls()
         else:
             return contextlib.nullcontext()
@@ -1811,41 +2128,20 @@ class DeferSigint(contextlib.AbstractContextManager):
         """SIGINT handler that defers the signal."""
         self.task_cancelled = True
 
-    def _signal_monkey_patch(self, signum, handler):
-        """Monkey patch for signal.signal that raises an error if a SIGINT handler is
-        registered within the DeferSigint context.
-        """
-        # Only raise an error if setting a SIGINT handler in the main thread; if setting
-        # a handler in a non-main thread, signal.signal will raise an error anyway
-        # indicating that Python does not allow that.
-        if (
-            threading.current_thread() == threading.main_thread()
-            and signum == signal.SIGINT
-        ):
-            raise ValueError(
-                "Can't set signal handler for SIGINT while SIGINT is being deferred "
-                "within a DeferSigint context."
-            )
-        return self.orig_signal(signum, handler)
-
     def __enter__(self):
-        # Save original SIGINT handler for later restoration.
-        self.orig_sigint_handler = signal.getsignal(signal.SIGINT)
-        # Set SIGINT signal handler that defers the signal.
-        signal.signal(signal.SIGINT, self._set_task_cancelled)
-        # Monkey patch signal.signal to raise an error if a SIGINT handler is registered
-        # within the context.
-        self.orig_signal = signal.signal
-        signal.signal = self._signal_monkey_patch
+        # Set SIGINT signal handler that defers the signal, saving the original SIGINT
+        # handler (returned by signal.signal()) for later restoration.
+        self.orig_sigint_handler = signal.signal(
+            signal.SIGINT, self._set_task_cancelled
+        )
         return self
 
     def __exit__(self, exc_type, exc, exc_tb):
         assert self.orig_sigint_handler is not None
-        assert self.orig_signal is not None
-        # Restore original signal.signal function.
-        signal.signal = self.orig_signal
-        # Restore original SIGINT handler.
-        signal.signal(signal.SIGINT, self.orig_sigint_handler)
+        # Restore original SIGINT handler, unless a new one was set within the
+        # context, in which case that one is kept.
+        if signal.getsignal(signal.SIGINT) == self._set_task_cancelled:
+            signal.signal(signal.SIGINT, self.orig_sigint_handler)
         if exc_type is None and self.task_cancelled:
             # No exception raised in context but task has been cancelled, so we raise
             # KeyboardInterrupt to go through the task cancellation path.
@@ -1859,6 +2155,10 @@ class DeferSigint(contextlib.AbstractContextManager):
 background_tasks = set()
 
 
+def _discard_background_task(task: asyncio.Task) -> None:
+    background_tasks.discard(task)
+
+
 def run_background_task(coroutine: Coroutine) -> asyncio.Task:
     """Schedule a task reliably to the event loop.
 
@@ -1877,14 +2177,18 @@ def run_background_task(coroutine: Coroutine) -> asyncio.Task:
 
     https://docs.python.org/3/library/asyncio-task.html#creating-tasks
     """
-    task = get_or_create_event_loop().create_task(coroutine)
+    # Fast path for the common case of being called from within a running loop.
+    loop = asyncio._get_running_loop()
+    if loop is None:
+        loop = get_or_create_event_loop()
+    task = loop.create_task(coroutine)
     # Add task to the set. This creates a strong reference.
     background_tasks.add(task)
 
     # To prevent keeping references to finished tasks forever,
     # make each task remove its own reference from the set after
     # completion:
-    task.add_done_callback(background_tasks.discard)
+    task.add_done_callback(_discard_background_task)
     return task
 
 
@@ -1893,7 +2197,12 @@ def try_import_each_module(module_names_to_import: List[str]) -> None:
     Make a best-effort attempt to import each named Python module.
     This is used by the Python default_worker.py to preload modules.
     """
+    loaded_modules = sys.modules
     for module_to_preload in module_names_to_import:
+        # Skip modules that are already imported. A None entry means the import
+        # is blocked, so let import_module() raise for it.
+        if loaded_modules.get(module_to_preload) is not None:
+            continue
         try:
             importlib.import_module(module_to_preload)
         except ImportError:
@@ -1909,10 +2218,13 @@ def update_envs(env_vars: Dict[str, str]):
         return
 
     for key, value in env_vars.items():
-        expanded = os.path.expandvars(value)
-        # Replace non-existant env vars with an empty string.
-        result = re.sub(r"\$\{[A-Z0-9_]+\}", "", expanded)
-        os.environ[key] = result
+        # Values without any variable references are used verbatim. On Windows,
+        # expandvars() also expands %VAR%.
+        if "$" in value or (_IS_WIN32 and "%" in value):
+            value = os.path.expandvars(value)
+            # Replace non-existant env vars with an empty string.
+            value = _UNEXPANDED_ENV_VAR_PATTERN.sub("", value)
+        os.environ[key] = value
 
 
 def parse_node_labels_json(
@@ -1924,10 +2236,10 @@ def parse_node_labels_json(
             raise ValueError(
                 "The format after deserialization is not a key-value pair map"
             )
+        # Keys of a JSON object are always strings, so only the values are checked.
+        # json.loads() never returns str subclasses, so an exact type check works.
         for key, value in labels.items():
-            if not isinstance(key, str):
-                raise ValueError("The key is not string type.")
-            if not isinstance(value, str):
+            if type(value) is not str:
                 raise ValueError(f'The value of the "{key}" is not string type')
     except Exception as e:
         cli_logger.abort(
@@ -1940,16 +2252,22 @@ def parse_node_labels_json(
     return labels
 
 
+# Label key prefixes that are reserved for Ray defined labels.
+_RESERVED_LABEL_KEY_PREFIXES = (ray_constants.RAY_DEFAULT_LABEL_KEYS_PREFIX,)
+
+
 def validate_node_labels(labels: Dict[str, str]):
     if labels is None:
         return
-    for key in labels.keys():
-        if key.startswith(ray_constants.RAY_DEFAULT_LABEL_KEYS_PREFIX):
-            raise ValueError(
-                f"Custom label keys `{key}` cannot start with the prefix "
-                f"`{ray_constants.RAY_DEFAULT_LABEL_KEYS_PREFIX}`. "
-                f"This is reserved for Ray defined labels."
-            )
+    key = next(
+        (key for key in labels if key.startswith(_RESERVED_LABEL_KEY_PREFIXES)), None
+    )
+    if key is not None:
+        prefix = next(p for p in _RESERVED_LABEL_KEY_PREFIXES if key.startswith(p))
+        raise ValueError(
+            f"Custom label keys `{key}` cannot start with the prefix `{prefix}`. "
+            "This is reserved for Ray defined labels."
+        )
 
 
 def pasre_pg_formatted_resources_to_original(
@@ -1958,44 +2276,46 @@ def pasre_pg_formatted_resources_to_original(
     original_resources = {}
 
     for key, value in pg_formatted_resources.items():
-        result = PLACEMENT_GROUP_WILDCARD_RESOURCE_PATTERN.match(key)
-        if result and len(result.groups()) == 2:
-            original_resources[result.group(1)] = value
-            continue
-        result = PLACEMENT_GROUP_INDEXED_BUNDLED_RESOURCE_PATTERN.match(key)
-        if result and len(result.groups()) == 3:
-            original_resources[result.group(1)] = value
-            continue
-        original_resources[key] = value
+        # Skip the regex for keys that can't be placement group resources.
+        result = "_group_" in key and PLACEMENT_GROUP_RESOURCE_PATTERN.match(key)
+        if result:
+            original_resources[result.group("name")] = value
+        else:
+            original_resources[key] = value
 
     return original_resources
 
 
+@functools.lru_cache(maxsize=256)
 def load_class(path):
     """Load a class at runtime given a full path.
 
     Example of the path: mypkg.mysubpkg.myclass
+
+    Loaded classes are cached by path.
     """
-    class_data = path.split(".")
-    if len(class_data) < 2:
+    module_path, sep, class_str = path.rpartition(".")
+    if not sep:
         raise ValueError("You need to pass a valid path like mymodule.provider_class")
-    module_path = ".".join(class_data[:-1])
-    class_str = class_data[-1]
     module = importlib.import_module(module_path)
     return getattr(module, class_str)
 
 
-def validate_actor_state_name(actor_state_name):
-    if actor_state_name is None:
-        return
-    actor_state_names = [
+_VALID_ACTOR_STATE_NAMES = frozenset(
+    [
         "DEPENDENCIES_UNREADY",
         "PENDING_CREATION",
         "ALIVE",
         "RESTARTING",
         "DEAD",
     ]
-    if actor_state_name not in actor_state_names:
+)
+
+
+def validate_actor_state_name(actor_state_name):
+    if actor_state_name is None:
+        return
+    if actor_state_name not in _VALID_ACTOR_STATE_NAMES:
         raise ValueError(
             f'"{actor_state_name}" is not a valid actor state name, '
             'it must be one of the following: "DEPENDENCIES_UNREADY", '
@@ -2004,7 +2324,7 @@ def validate_actor_state_name(actor_state_name):
 
 
 def get_current_node_cpu_model_name() -> Optional[str]:
-    if not sys.platform.startswith("linux"):
+    if not _IS_LINUX:
         return None
 
     try:
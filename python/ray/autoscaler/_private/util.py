@@ -13,10 +13,7 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 
 import ray
 import ray._private.services as services
-from ray._private.utils import (
-    PLACEMENT_GROUP_INDEXED_BUNDLED_RESOURCE_PATTERN,
-    PLACEMENT_GROUP_WILDCARD_RESOURCE_PATTERN,
-)
+from ray._private.utils import PLACEMENT_GROUP_RESOURCE_PATTERN
 from ray.autoscaler._private import constants
 from ray.autoscaler._private.cli_logger import cli_logger
 from ray.autoscaler._private.docker import validate_docker_config
@@ -81,10 +78,7 @@ def is_placement_group_resource(resource_name: str) -> bool:
     """
     Check if a resource name is structured like a placement group.
     """
-    return bool(
-        PLACEMENT_GROUP_WILDCARD_RESOURCE_PATTERN.match(resource_name)
-        or PLACEMENT_GROUP_INDEXED_BUNDLED_RESOURCE_PATTERN.match(resource_name)
-    )
+    return bool(PLACEMENT_GROUP_RESOURCE_PATTERN.match(resource_name))
 
 
 @dataclass
@@ -553,16 +547,10 @@ def parse_placement_group_resource_str(
         have duplicated resource information as
         wildcard resources (resource name without bundle index).
     """
-    result = PLACEMENT_GROUP_INDEXED_BUNDLED_RESOURCE_PATTERN.match(
-        placement_group_resource_str
-    )
-    if result:
-        return (result.group(1), result.group(3), False)
-    result = PLACEMENT_GROUP_WILDCARD_RESOURCE_PATTERN.match(
-        placement_group_resource_str
-    )
+    result = PLACEMENT_GROUP_RESOURCE_PATTERN.match(placement_group_resource_str)
     if result:
-        return (result.group(1), result.group(2), True)
+        is_countable_resource = result.group("bundle_index") is None
+        return (result.group("name"), result.group("pg_id"), is_countable_resource)
     return (placement_group_resource_str, None, True)
 
 
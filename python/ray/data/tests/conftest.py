@@ -436,7 +436,7 @@ def unsupported_pyarrow_version(request):
     # Unset pyarrow version cache.
     import ray._private.utils as utils
 
-    utils._PYARROW_VERSION = None
+    utils._PYARROW_VERSION = utils._PYARROW_UNSET
     yield request.param
     pa.__version__ = orig_version
 
@@ -311,6 +311,79 @@ def test_get_system_memory():
         )
 
 
+@pytest.mark.skipif(sys.platform == "win32", reason="not relevant for windows")
+def test_get_cgroup_used_memory():
+    # cgroups v1
+    with tempfile.NamedTemporaryFile("w") as memory_stat_file:
+        memory_stat_file.write(
+            "cache 100\n"
+            "rss 200\n"
+            "inactive_file 10\n"
+            "total_cache 1000\n"
+            "total_rss 2000\n"
+            "total_inactive_file 300\n"
+        )
+        memory_stat_file.flush()
+        assert (
+            ray._private.utils.get_cgroupv1_used_memory(memory_stat_file.name)
+            == 2000 + 1000 - 300
+        )
+
+    # cgroups v1, missing keys
+    with tempfile.NamedTemporaryFile("w") as memory_stat_file:
+        memory_stat_file.write("cache 100\nrss 200\n")
+        memory_stat_file.flush()
+        assert (
+            ray._private.utils.get_cgroupv1_used_memory(memory_stat_file.name) is None
+        )
+
+    # cgroups v2
+    with tempfile.NamedTemporaryFile(
+        "w"
+    ) as memory_stat_file, tempfile.NamedTemporaryFile("w") as memory_current_file:
+        memory_stat_file.write("anon 5\nfile 100\ninactive_file 40\n")
+        memory_stat_file.flush()
+        memory_current_file.write("500\n")
+        memory_current_file.flush()
+        assert (
+            ray._private.utils.get_cgroupv2_used_memory(
+                memory_stat_file.name, memory_current_file.name
+            )
+            == 500 - 40
+        )
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="not relevant for windows")
+def test_read_cgroup_file_cached_fd(tmp_path, monkeypatch):
+    # Treat tmp_path as the cgroup fs so that reads go through the cached fds.
+    monkeypatch.setattr(
+        ray._private.utils, "_CGROUP_FS_PREFIX", os.path.join(str(tmp_path), "")
+    )
+    ray._private.utils._close_cgroup_fds()
+    try:
+        memory_current = tmp_path / "memory.current"
+        memory_current.write_text("500\n")
+        assert ray._private.utils._read_small_file(str(memory_current)) == "500"
+        assert str(memory_current) in ray._private.utils._CGROUP_FDS
+
+        # Rewrites (longer and shorter) are seen on re-read.
+        memory_current.write_text("123456\n")
+        assert ray._private.utils._read_small_file(str(memory_current)) == "123456"
+        memory_current.write_text("7\n")
+        assert ray._private.utils._read_small_file(str(memory_current)) == "7"
+        assert ray._private.utils._read_cgroup_file(str(memory_current)) == "7"
+
+        # Missing files still raise FileNotFoundError and aren't cached.
+        missing = str(tmp_path / "memory.max")
+        with pytest.raises(FileNotFoundError):
+            ray._private.utils._read_small_file(missing)
+        assert ray._private.utils._read_cgroup_file(missing) is None
+        assert missing not in ray._private.utils._CGROUP_FDS
+    finally:
+        ray._private.utils._close_cgroup_fds()
+    assert not ray._private.utils._CGROUP_FDS
+
+
 @pytest.mark.parametrize("in_k8s", [True, False])
 @pytest.mark.parametrize("env_disable", [True, False])
 @pytest.mark.parametrize("override_disable", [True, False])
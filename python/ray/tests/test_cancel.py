@@ -124,13 +124,20 @@ def test_defer_sigint():
         pytest.fail("SIGINT signal was never sent in test")
 
 
-def test_defer_sigint_monkey_patch():
-    # Tests that setting a SIGINT signal handler within a DeferSigint context is not
-    # allowed.
+def test_defer_sigint_handler_set_in_context():
+    # Tests that a SIGINT signal handler set within a DeferSigint context is kept when
+    # the context is left, instead of being replaced by the original handler.
     orig_sigint_handler = signal.getsignal(signal.SIGINT)
-    with pytest.raises(ValueError):
+
+    def new_sigint_handler(signum, frame):
+        pass
+
+    try:
         with DeferSigint():
-            signal.signal(signal.SIGINT, orig_sigint_handler)
+            signal.signal(signal.SIGINT, new_sigint_handler)
+        assert signal.getsignal(signal.SIGINT) is new_sigint_handler
+    finally:
+        signal.signal(signal.SIGINT, orig_sigint_handler)
 
 
 def test_defer_sigint_noop_in_non_main_thread():
@@ -12,6 +12,7 @@ import ray._private.storage as storage
 from ray._private.test_utils import simulate_storage
 from ray._private.utils import (
     _add_creatable_buckets_param_if_s3_uri,
+    _add_url_query_params,
     _get_pyarrow_version,
 )
 from ray.tests.conftest import *  # noqa
@@ -212,6 +213,38 @@ def test_add_creatable_buckets_param_if_s3_uri():
     assert _add_creatable_buckets_param_if_s3_uri(uri) == "gcs://bucket/foo"
 
 
+def test_add_url_query_params():
+    # Test that params are appended to a URL without query args.
+    assert (
+        _add_url_query_params("s3://bucket/foo", {"a": True, "b": 1})
+        == "s3://bucket/foo?a=true&b=1"
+    )
+
+    # Test that repeated existing query args are all kept, in order.
+    assert (
+        _add_url_query_params("s3://bucket/foo?x=1&x=2", {"a": "b"})
+        == "s3://bucket/foo?a=b&x=1&x=2"
+    )
+
+    # Test that blank existing query args are kept.
+    assert (
+        _add_url_query_params("s3://bucket/foo?x=", {"a": "b"})
+        == "s3://bucket/foo?a=b&x="
+    )
+
+    # Test that an existing query arg overrides the new param of the same name and
+    # stays at its own position.
+    assert (
+        _add_url_query_params("s3://bucket/foo?x=1&a=false", {"a": True, "b": "c"})
+        == "s3://bucket/foo?b=c&x=1&a=false"
+    )
+
+    # Test that the passed params are not mutated.
+    params = {"a": True}
+    _add_url_query_params("s3://bucket/foo?x=1", params)
+    assert params == {"a": True}
+
+
 if __name__ == "__main__":
     import sys
 
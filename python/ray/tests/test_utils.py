@@ -9,6 +9,7 @@ import pytest
 import logging
 from ray._private.utils import (
     get_or_create_event_loop,
+    import_attr,
     pasre_pg_formatted_resources_to_original,
     try_import_each_module,
     get_current_node_cpu_model_name,
@@ -81,6 +82,23 @@ def test_try_import_each_module():
             )
 
 
+def test_import_attr():
+    import os.path
+
+    assert import_attr("os.path.join") is os.path.join
+    assert import_attr("os.path:join") is os.path.join
+    assert import_attr("os.path.join", reload_module=True) is os.path.join
+
+    with pytest.raises(ValueError, match="at most one colon"):
+        import_attr("os:path:join")
+
+    # A path without a module raises ModuleNotFoundError, like an unknown module.
+    with pytest.raises(ModuleNotFoundError, match="must include a module"):
+        import_attr("join")
+    with pytest.raises(ModuleNotFoundError):
+        import_attr("fake_module_does_not_exist.attr")
+
+
 def test_pasre_pg_formatted_resources():
     out = pasre_pg_formatted_resources_to_original(
         {"CPU_group_e765be422c439de2cd263c5d9d1701000000": 1, "memory": 100}